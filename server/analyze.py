@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+# --------------------------------------------------------
+# AffectSense
+# Copyright 2025 Tavaheed Tariq , GAASH LAB
+# --------------------------------------------------------
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import cv2
+import pandas as pd
+import torch
+
+from config import load_config
+from models.resnet_emotion import load_emotion_model
+from database import init_db, create_session, close_session, save_emotions_to_db, get_saved_filenames
+from utils.image_processing import (
+    detect_faces,
+    extract_faces,
+    classify_faces,
+    build_result,
+    get_empty_result,
+    class_names
+)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+
+def iter_images(root):
+    """Yield image paths under root in a stable order, so a checkpoint can skip a prefix"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.join(dirpath, filename)
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def init_worker():
+    # Parallelism comes from the pool, not from threads inside each worker
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+
+def prepare_images(paths, use_retinaface):
+    """Decode images and crop their faces; runs in a worker process"""
+    prepared = []
+    for path in paths:
+        try:
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is None or frame.size == 0:
+                prepared.append((path, None))
+                continue
+            face_regions = detect_faces(frame, use_retinaface=use_retinaface)
+            faces = [(coords, tensor.numpy()) for coords, tensor in extract_faces(frame, face_regions)]
+            prepared.append((path, faces))
+        except Exception as e:
+            print(f"Error preparing image {path}: {e}")
+            prepared.append((path, None))
+    return prepared
+
+class FaceBatcher:
+    """Collect faces across worker chunks so every forward pass holds batch_size faces.
+
+    Results come out in image order, so the number of completed images is a
+    prefix of the directory that a checkpoint can skip.
+    """
+
+    def __init__(self, model, device, batch_size, session_id=None):
+        self.model = model
+        self.device = device
+        self.batch_size = batch_size
+        self.session_id = session_id
+        self.images = deque()
+        self.faces = []
+        self.faces_data = []
+        self.completed = 0
+
+    def add(self, prepared):
+        """Queue the prepared images of a chunk and return the results of images now classified"""
+        for path, faces in prepared:
+            self.images.append((path, faces))
+            if faces:
+                self.faces.extend(faces)
+        while len(self.faces) >= self.batch_size:
+            self._classify(self.batch_size)
+        return self._collect()
+
+    def finish(self):
+        """Classify the faces left in a partial batch and return the remaining results"""
+        if self.faces:
+            self._classify(len(self.faces))
+        return self._collect()
+
+    def _classify(self, count):
+        batch, self.faces = self.faces[:count], self.faces[count:]
+        self.faces_data.extend(classify_faces(batch, self.model, self.device))
+
+    def _collect(self):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        results = []
+        offset = 0
+        while self.images:
+            path, faces = self.images[0]
+            num_faces = len(faces) if faces else 0
+            if offset + num_faces > len(self.faces_data):
+                # Some faces of this image are still waiting for a full batch
+                break
+            self.images.popleft()
+            self.completed += 1
+            if faces is None:
+                print(f"Warning: Could not decode image {path}")
+                continue
+            if faces:
+                result = build_result(timestamp, self.faces_data[offset:offset + num_faces], self.session_id)
+                offset += num_faces
+            else:
+                result = get_empty_result(timestamp, self.session_id)
+            result['filename'] = path
+            results.append(result)
+        del self.faces_data[:offset]
+        return results
+
+def to_row(result):
+    row = {
+        'filename': result['filename'],
+        'timestamp': result['timestamp'],
+        'faces_found': result['faces_found'],
+        'num_faces': len(result['faces']),
+        'predicted_class': result.get('predicted_class'),
+        'confidence': result.get('confidence')
+    }
+    for emotion in class_names:
+        row[emotion] = result.get(emotion)
+    row['faces'] = json.dumps(result['faces'])
+    return row
+
+def load_checkpoint(path, root):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        checkpoint = json.load(file)
+    if checkpoint.get('root') != root:
+        raise SystemExit(f"Checkpoint {path} belongs to {checkpoint.get('root')}, not {root}")
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(tmp_path, path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Analyze emotions of every image in a directory')
+    parser.add_argument('directory', help='Directory to scan recursively for images')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--session', help='Name of the session to store results in (default)')
+    output.add_argument('--parquet', metavar='DIR', help='Write results as Parquet part files to DIR')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Decode/detect processes')
+    parser.add_argument('--batch-size', type=int, default=64, help='Faces per forward pass, collected across chunks')
+    parser.add_argument('--chunk-size', type=int, default=32, help='Images handed to a worker at a time')
+    parser.add_argument('--flush-every', type=int, default=1000, help='Results written per flush and checkpoint')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: next to the output)')
+    parser.add_argument('--no-resume', action='store_true', help='Ignore an existing checkpoint')
+    parser.add_argument('--detector', choices=['retinaface', 'haar'], default='retinaface')
+    parser.add_argument('--log-every', type=float, default=5.0, help='Seconds between progress lines')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    root = os.path.abspath(args.directory)
+    if not os.path.isdir(root):
+        raise SystemExit(f"Not a directory: {root}")
+
+    checkpoint_path = args.checkpoint
+    if not checkpoint_path:
+        if args.parquet:
+            checkpoint_path = os.path.join(args.parquet, 'checkpoint.json')
+        else:
+            checkpoint_path = f'analyze_{os.path.basename(root.rstrip(os.sep))}.checkpoint.json'
+    checkpoint = {} if args.no_resume else load_checkpoint(checkpoint_path, root)
+    checkpoint['root'] = root
+    done = checkpoint.get('done', 0)
+
+    session_id = None
+    # Rows of the flush that was cut short before its checkpoint may already be stored
+    check_saved = False
+    if args.parquet:
+        os.makedirs(args.parquet, exist_ok=True)
+        checkpoint.setdefault('next_part', 0)
+    else:
+        init_db()
+        session_id = checkpoint.get('session_id')
+        if session_id:
+            check_saved = True
+        else:
+            session_id = create_session(args.session or f'Offline {os.path.basename(root)}')
+            checkpoint['session_id'] = session_id
+            checkpoint['done'] = done
+            # Record the session before any rows go in, so a crash resumes into it
+            save_checkpoint(checkpoint_path, checkpoint)
+        print(f"Writing results to session {session_id}")
+    if done:
+        print(f"Resuming after {done} images from {checkpoint_path}")
+
+    cfg = load_config()
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_emotion_model(cfg, device)
+
+    buffer = []
+    batcher = FaceBatcher(model, device, args.batch_size, session_id)
+    processed = 0
+    faces_count = 0
+    start_time = time.perf_counter()
+    last_log = start_time
+
+    def flush():
+        nonlocal check_saved
+        if buffer and check_saved:
+            # Rows are committed before the checkpoint, so the first flush after a
+            # resume may repeat images the interrupted run already stored
+            saved = get_saved_filenames(session_id, (result['filename'] for result in buffer))
+            if saved:
+                print(f"Skipping {len(saved)} images already stored in session {session_id}")
+                buffer[:] = [result for result in buffer if result['filename'] not in saved]
+            check_saved = False
+        if buffer:
+            if args.parquet:
+                part_path = os.path.join(args.parquet, f"part-{checkpoint['next_part']:06d}.parquet")
+                pd.DataFrame([to_row(result) for result in buffer]).to_parquet(part_path, index=False)
+                checkpoint['next_part'] += 1
+                buffer.clear()
+            elif not save_emotions_to_db(buffer):
+                raise RuntimeError(f"Failed to save results to session {session_id}")
+        checkpoint['done'] = done + processed
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    use_retinaface = args.detector == 'retinaface'
+    chunks = iter_chunks(islice(iter_images(root), done, None), args.chunk_size)
+    # Spawned workers keep torch/TensorFlow state out of forked children
+    executor = ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker
+    )
+    try:
+        # A bounded window of chunks in flight keeps memory flat on huge directories
+        pending = deque()
+
+        def submit_next():
+            chunk = next(chunks, None)
+            if chunk is None:
+                return False
+            pending.append(executor.submit(prepare_images, chunk, use_retinaface))
+            return True
+
+        for _ in range(args.workers * 2):
+            if not submit_next():
+                break
+
+        def collect(results):
+            nonlocal processed, faces_count
+            buffer.extend(results)
+            # Images still waiting for a full batch are not counted, so checkpoints never skip them
+            processed = batcher.completed
+            faces_count += sum(len(result['faces']) for result in results)
+            if len(buffer) >= args.flush_every:
+                flush()
+
+        while pending:
+            prepared = pending.popleft().result()
+            submit_next()
+            collect(batcher.add(prepared))
+
+            now = time.perf_counter()
+            if now - last_log >= args.log_every:
+                rate = processed / (now - start_time)
+                print(f"{done + processed} images, {faces_count} faces, {rate:.1f} images/sec")
+                last_log = now
+        collect(batcher.finish())
+        flush()
+    except KeyboardInterrupt:
+        # Only whole flushes are checkpointed, so the interrupted tail is redone on resume
+        print(f"Interrupted, resume from {checkpoint_path}")
+        raise
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    if session_id:
+        close_session(session_id)
+    elapsed = time.perf_counter() - start_time
+    print(f"Processed {processed} images ({faces_count} faces) in {elapsed:.1f}s, "
+          f"{processed / max(elapsed, 1e-9):.1f} images/sec")
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Error analyzing directory: {e}")
+        traceback.print_exc()
+        raise SystemExit(1)
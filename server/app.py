@@ -9,33 +9,46 @@ from flask import Flask
 from flask_cors import CORS
 import torch
 from config import load_config
-from models.resnet_emotion import EmotionResNet
+from models.resnet_emotion import load_emotion_model
 from database import init_db
 from routes.detection import detection_bp
 from routes.sessions import sessions_bp
 from routes.data import data_bp
+from routes.maintenance import maintenance_bp
+from utils.retention import start_retention_worker
+from utils.serialization import FastJSONProvider
 
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 cfg = load_config()
+server_cfg = cfg.get('server', {})
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-model = EmotionResNet(
-    num_classes=cfg['training']['num_classes'], 
-    pretrained=cfg['training']['pretrained']
-).to(device)
-checkpoint = torch.load(cfg['test']['ckpt'], map_location=device)
-model.load_state_dict(checkpoint['model_state_dict'])
-model.eval()
+# Each request thread runs its own forward pass; cap intra-op threads so they do not oversubscribe the cores
+if server_cfg.get('torch_threads'):
+    torch.set_num_threads(server_cfg['torch_threads'])
+
+model = load_emotion_model(cfg, device)
+
+# Read-only after this point, so request threads can share it
+app.config['model'] = model
+app.config['device'] = device
 
 init_db()
+start_retention_worker()
 
 app.register_blueprint(detection_bp)
 app.register_blueprint(sessions_bp)
 app.register_blueprint(data_bp)
+app.register_blueprint(maintenance_bp)
 
 if __name__ == '__main__':
-    app.run(port=5000)
\ No newline at end of file
+    app.run(
+        host=server_cfg.get('host', '127.0.0.1'),
+        port=server_cfg.get('port', 5000),
+        threaded=server_cfg.get('threaded', True)
+    )
\ No newline at end of file
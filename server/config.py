@@ -1,5 +1,9 @@
+import os
 import yaml
 
-def load_config(path='configs/config.yaml'):
+def load_config(path=None):
+    # AFFECTSENSE_CONFIG points every module at another config, e.g. for load tests
+    if path is None:
+        path = os.environ.get('AFFECTSENSE_CONFIG', 'configs/config.yaml')
     with open(path, 'r') as file:
         return yaml.safe_load(file)
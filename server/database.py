@@ -6,14 +6,26 @@
 import sqlite3
 import traceback
 from datetime import datetime
+from config import load_config
 
-current_session_id = None
-emotion_buffer = []
+DB_PATH = load_config().get('database', {}).get('path', 'emotions.db')
 BUFFER_SIZE = 10  
+INCREMENTAL_VACUUM = 2
+
+# Records are only accepted while their session is open; checking in the same
+# statement means a session that ends or is archived cannot gain rows afterwards
+INSERT_RECORD = """
+    INSERT INTO emotion_records
+    (timestamp, angry, disgust, fear, happy, sad, surprise, neutral, predicted_class, session_id, filename)
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    WHERE EXISTS (SELECT 1 FROM sessions WHERE id = ? AND end_time IS NULL AND archive_path IS NULL)
+"""
 
 def get_db_connection():
     """Create and return a database connection"""
-    conn = sqlite3.connect('emotions.db')
+    # Connections are per call, so a thread never shares one; the timeout lets
+    # concurrent writers wait for the lock instead of failing with "database is locked"
+    conn = sqlite3.connect(DB_PATH, timeout=30)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -51,7 +63,34 @@ def init_db():
             )
         """)
         
+        # Columns added after the initial schema are migrated in place
+        cursor.execute("PRAGMA table_info(sessions)")
+        session_columns = [row['name'] for row in cursor.fetchall()]
+        if 'archive_path' not in session_columns:
+            cursor.execute("ALTER TABLE sessions ADD COLUMN archive_path TEXT")
+
+        cursor.execute("PRAGMA table_info(emotion_records)")
+        record_columns = [row['name'] for row in cursor.fetchall()]
+        if 'filename' not in record_columns:
+            cursor.execute("ALTER TABLE emotion_records ADD COLUMN filename TEXT")
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_emotion_records_session
+            ON emotion_records (session_id, timestamp)
+        """)
+        
         conn.commit()
+
+        # WAL lets readers keep going while another thread writes
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        # Free pages are only reclaimed by incremental_vacuum once the file
+        # is in incremental mode, which needs a full VACUUM to switch over
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != INCREMENTAL_VACUUM:
+            cursor.execute(f"PRAGMA auto_vacuum = {INCREMENTAL_VACUUM}")
+            cursor.execute("VACUUM")
+
         print("Database initialized successfully.")
     except Exception as e:
         print(f"Error initializing database: {e}")
@@ -73,9 +112,7 @@ def save_single_emotion(emotion):
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
-            """INSERT INTO emotion_records 
-            (timestamp, angry, disgust, fear, happy, sad, surprise, neutral, predicted_class, session_id) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            INSERT_RECORD,
             (
                 emotion['timestamp'],
                 emotion.get('Angry', 0),
@@ -86,10 +123,15 @@ def save_single_emotion(emotion):
                 emotion.get('Surprise', 0),
                 emotion.get('Neutral', 0),
                 emotion['predicted_class'],
+                emotion['session_id'],
+                emotion.get('filename'),
                 emotion['session_id']
             )
         )
         conn.commit()
+        if cursor.rowcount == 0:
+            print(f"Warning: Session {emotion['session_id']} is not active, emotion not saved")
+            return False
         print(f"Single emotion data saved successfully for session {emotion['session_id']}.")
         return True
     except Exception as e:
@@ -102,9 +144,8 @@ def save_single_emotion(emotion):
         if conn:
             conn.close()
 
-def save_emotions_to_db():
-    """Save buffered emotion data to database"""
-    global emotion_buffer
+def save_emotions_to_db(emotion_buffer):
+    """Save a buffer of emotion data to database and clear it"""
     if not emotion_buffer:
         print("No emotions in buffer to save.")
         return False
@@ -121,9 +162,7 @@ def save_emotions_to_db():
                 continue
                 
             cursor.execute(
-                """INSERT INTO emotion_records 
-                (timestamp, angry, disgust, fear, happy, sad, surprise, neutral, predicted_class, session_id) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                INSERT_RECORD,
                 (
                     emotion['timestamp'],
                     emotion.get('Angry', 0),
@@ -134,9 +173,14 @@ def save_emotions_to_db():
                     emotion.get('Surprise', 0),
                     emotion.get('Neutral', 0),
                     emotion['predicted_class'],
+                    emotion['session_id'],
+                    emotion.get('filename'),
                     emotion['session_id']
                 )
             )
+            if cursor.rowcount == 0:
+                print(f"Warning: Skipping emotion for inactive session {emotion['session_id']}")
+                continue
             saved_count += 1
             
         conn.commit()
@@ -153,9 +197,109 @@ def save_emotions_to_db():
         if conn:
             conn.close()
 
-def force_save_remaining_emotions():
+def force_save_remaining_emotions(emotion_buffer):
     """Force save any remaining emotions in the buffer"""
     if emotion_buffer:
         print(f"Force saving {len(emotion_buffer)} remaining emotions in buffer.")
-        return save_emotions_to_db()
-    return False
\ No newline at end of file
+        return save_emotions_to_db(emotion_buffer)
+    return False
+
+def create_session(name):
+    """Insert a new session and return its id"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO sessions (start_time, name) VALUES (?, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), name)
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        if conn:
+            conn.close()
+
+def close_session(session_id):
+    """Set the end time of a session that is still open"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE sessions SET end_time = ? WHERE id = ? AND end_time IS NULL",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), session_id)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        if conn:
+            conn.close()
+
+def is_session_active(session_id):
+    """Return whether a session exists and still accepts emotion records"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND end_time IS NULL AND archive_path IS NULL",
+            (session_id,)
+        )
+        return cursor.fetchone() is not None
+    finally:
+        if conn:
+            conn.close()
+
+def get_saved_filenames(session_id, filenames):
+    """Return which of the given filenames already have a record in the session"""
+    conn = None
+    saved = set()
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        filenames = list(filenames)
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(filenames), 500):
+            chunk = filenames[start:start + 500]
+            cursor.execute(
+                f"SELECT filename FROM emotion_records WHERE session_id = ? AND filename IN ({', '.join('?' * len(chunk))})",
+                (session_id, *chunk)
+            )
+            saved.update(row['filename'] for row in cursor.fetchall())
+        return saved
+    finally:
+        if conn:
+            conn.close()
+
+def get_active_session():
+    """Return the most recently started session that has not ended, if any"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM sessions WHERE end_time IS NULL ORDER BY id DESC LIMIT 1")
+        return cursor.fetchone()
+    finally:
+        if conn:
+            conn.close()
+
+def incremental_vacuum(pages=None):
+    """Return free pages left behind by deletes to the filesystem"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        # execute() only steps the pragma once, which frees a single page;
+        # executescript() runs it to completion
+        if pages:
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        else:
+            conn.executescript("PRAGMA incremental_vacuum;")
+        return True
+    except Exception as e:
+        print(f"Error running incremental vacuum: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+
+# --------------------------------------------------------
+# AffectSense
+# Copyright 2025 Tavaheed Tariq , GAASH LAB
+# --------------------------------------------------------
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import cv2
+import numpy as np
+import yaml
+
+from config import load_config
+
+FRAME_ENDPOINT = '/api/process_frame'
+
+class Stats:
+    """Latencies and errors per endpoint, shared by all client threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.skipped_frames = 0
+
+    def record(self, endpoint, latency_ms, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, [])
+            self.errors.setdefault(endpoint, 0)
+            if ok:
+                self.latencies[endpoint].append(latency_ms)
+            else:
+                self.errors[endpoint] += 1
+
+    def record_skipped(self):
+        with self.lock:
+            self.skipped_frames += 1
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def request_json(base_url, path, payload=None, timeout=30):
+    """Send a request and return (status, headers, parsed body)"""
+    data = None
+    headers = {}
+    if payload is not None:
+        data = json.dumps(payload).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(base_url + path, data=data, headers=headers,
+                                 method='POST' if payload is not None else 'GET')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            body = response.read()
+            # MessagePack frame responses are timed but not decoded
+            if body and response.headers.get_content_type() == 'application/json':
+                return response.status, response.headers, json.loads(body)
+            return response.status, response.headers, None
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, None
+
+def synthetic_face(size, rng):
+    """Draw a rough face so frames look like camera frames to the detector"""
+    frame = rng.integers(60, 120, (size, size, 3), dtype=np.uint8)
+    center = (size // 2 + int(rng.integers(-size // 10, size // 10)), size // 2)
+    axes = (size // 4, size // 3)
+    skin = tuple(int(c) for c in rng.integers(140, 220, 3))
+    cv2.ellipse(frame, center, axes, 0, 0, 360, skin, -1)
+    eye_y = center[1] - axes[1] // 4
+    for dx in (-axes[0] // 2, axes[0] // 2):
+        cv2.circle(frame, (center[0] + dx, eye_y), max(2, size // 40), (30, 30, 30), -1)
+    mouth_y = center[1] + axes[1] // 2
+    cv2.ellipse(frame, (center[0], mouth_y), (axes[0] // 2, axes[1] // 8), 0, 0, 180, (40, 40, 120), 2)
+    return frame
+
+def load_frames(args):
+    """Base64 data URLs of the frames clients cycle through"""
+    images = []
+    if args.image_dir:
+        for name in sorted(os.listdir(args.image_dir)):
+            image = cv2.imread(os.path.join(args.image_dir, name), cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append(image)
+    if not images:
+        rng = np.random.default_rng(args.seed)
+        images = [synthetic_face(args.image_size, rng) for _ in range(args.num_frames)]
+
+    frames = []
+    for image in images:
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if ok:
+            frames.append('data:image/jpeg;base64,' + base64.b64encode(encoded.tobytes()).decode('ascii'))
+    return frames
+
+def camera_client(base_url, frames, args, stats, stop_event, session_ids, client_index):
+    """Behave like one CameraPage: start a session, then stream frames at the given fps"""
+    start = time.perf_counter()
+    try:
+        status, _, body = request_json(base_url, '/api/session/start', {'name': f'loadtest-client-{client_index}'})
+        ok = status == 200 and bool(body)
+    except (urllib.error.URLError, OSError):
+        ok = False
+    stats.record('/api/session/start', (time.perf_counter() - start) * 1000, ok)
+    if not ok:
+        return
+    session_id = body['session_id']
+    session_ids.append(session_id)
+
+    payload = {'session_id': session_id, 'isCamera': True}
+    if args.target_fps:
+        payload['target_fps'] = args.target_fps
+    if args.format != 'default':
+        payload['response_format'] = args.format
+
+    interval = 1.0 / args.fps
+    # Stagger clients so they do not all fire on the same tick
+    next_send = time.perf_counter() + random.random() * interval
+    frame_index = client_index
+    while not stop_event.is_set():
+        delay = next_send - time.perf_counter()
+        if delay > 0 and stop_event.wait(delay):
+            break
+        payload['image'] = frames[frame_index % len(frames)]
+        frame_index += 1
+        start = time.perf_counter()
+        try:
+            status, headers, _ = request_json(base_url, FRAME_ENDPOINT, payload)
+            ok = status == 200
+            if ok and headers.get('X-Frame-Skipped'):
+                stats.record_skipped()
+        except (urllib.error.URLError, OSError):
+            ok = False
+        stats.record(FRAME_ENDPOINT, (time.perf_counter() - start) * 1000, ok)
+        # A slow server lowers the achieved rate instead of building a backlog
+        next_send = max(next_send + interval, time.perf_counter())
+
+    start = time.perf_counter()
+    try:
+        status, _, _ = request_json(base_url, '/api/session/end', {'session_id': session_id})
+        ok = status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    stats.record('/api/session/end', (time.perf_counter() - start) * 1000, ok)
+
+def read_poller(base_url, args, stats, stop_event, session_ids):
+    """Poll the read endpoints the session and history pages use"""
+    while not stop_event.wait(args.poll_interval):
+        paths = ['/api/sessions', '/api/latest-emotions']
+        if session_ids:
+            paths.append(f'/api/session/{random.choice(session_ids)}/emotions')
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                status, _, _ = request_json(base_url, path)
+                ok = status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            label = '/api/session/<id>/emotions' if path.endswith('/emotions') else path
+            stats.record(label, (time.perf_counter() - start) * 1000, ok)
+
+def db_size(db_path):
+    if not db_path:
+        return None
+    return sum(os.path.getsize(path) for path in (db_path, db_path + '-wal') if os.path.exists(path))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def spawn_server(workdir):
+    """Start app.py against a scratch database with a randomly initialized model.
+
+    Nothing is downloaded: ImageNet weights are disabled, no checkpoint is read,
+    and clients use the Haar detector.
+    """
+    cfg = load_config()
+    port = free_port()
+    cfg['training']['pretrained'] = False
+    cfg['test']['random_weights'] = True
+    cfg['database'] = {'path': os.path.join(workdir, 'loadtest.db')}
+    cfg.setdefault('server', {}).update({'host': '127.0.0.1', 'port': port, 'threaded': True})
+    cfg.setdefault('retention', {}).update({'interval_minutes': 0, 'archive_dir': os.path.join(workdir, 'archives')})
+    cfg.setdefault('profiling', {}).update({'output_dir': os.path.join(workdir, 'profiles')})
+    config_path = os.path.join(workdir, 'config.yaml')
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(cfg, file)
+
+    env = dict(os.environ, AFFECTSENSE_CONFIG=config_path)
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited early, see {log.name}")
+        try:
+            if request_json(base_url, '/api/sessions', timeout=2)[0] == 200:
+                return process, base_url, cfg['database']['path']
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"Server did not come up, see {log.name}")
+
+def build_report(stats, args, duration, session_ids, base_url, db_before, db_after):
+    report = {
+        'clients': args.clients,
+        'fps_per_client': args.fps,
+        'duration_s': round(duration, 2),
+        'offered_fps': args.clients * args.fps,
+        'endpoints': {}
+    }
+    for endpoint, latencies in sorted(stats.latencies.items()):
+        latencies = sorted(latencies)
+        errors = stats.errors.get(endpoint, 0)
+        total = len(latencies) + errors
+        report['endpoints'][endpoint] = {
+            'requests': total,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'throughput_rps': len(latencies) / duration,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99)
+        }
+    frame_stats = report['endpoints'].get(FRAME_ENDPOINT, {})
+    report['achieved_fps'] = frame_stats.get('throughput_rps', 0.0)
+    report['skipped_frames'] = stats.skipped_frames
+
+    rows = 0
+    for session_id in session_ids:
+        try:
+            status, _, body = request_json(base_url, f'/api/session/{session_id}/emotions')
+        except (urllib.error.URLError, OSError):
+            # A server that died under load still gets a report; rows are then a lower bound
+            report['db_rows_incomplete'] = True
+            continue
+        if status == 200 and body:
+            rows += len(body)
+    report['db_rows_written'] = rows
+    if db_before is not None and db_after is not None:
+        report['db_bytes_before'] = db_before
+        report['db_bytes_after'] = db_after
+        report['db_bytes_per_row'] = (db_after - db_before) / rows if rows else None
+    return report
+
+def print_report(report):
+    print(f"\n{report['clients']} clients x {report['fps_per_client']} fps for {report['duration_s']}s "
+          f"(offered {report['offered_fps']} fps, achieved {report['achieved_fps']:.1f} fps, "
+          f"{report['skipped_frames']} frames skipped by the server)")
+    print(f"{'endpoint':<30}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in report['endpoints'].items():
+        cells = [f"{row[key]:.1f}" if row[key] is not None else '-' for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+        print(f"{endpoint:<30}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>9.1f}"
+              f"{cells[0]:>10}{cells[1]:>10}{cells[2]:>10}")
+    print(f"Rows written: {report['db_rows_written']}"
+          + (" (server unreachable for some sessions)" if report.get('db_rows_incomplete') else ''))
+    if 'db_bytes_after' in report:
+        growth = report['db_bytes_after'] - report['db_bytes_before']
+        print(f"Database grew by {growth / 1024:.1f} KiB"
+              + (f" ({report['db_bytes_per_row']:.0f} bytes/row)" if report['db_bytes_per_row'] else ''))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Simulate concurrent camera clients against the backend')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Server to test (ignored with --spawn)')
+    parser.add_argument('--spawn', action='store_true',
+                        help='Start a local server with a random model and a scratch database')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent camera clients')
+    parser.add_argument('--fps', type=float, default=5.0, help='Frames per second per client')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--target-fps', type=float, help='Ask the server latency controller for this fps')
+    parser.add_argument('--format', choices=['default', 'compact', 'msgpack'], default='default')
+    parser.add_argument('--pollers', type=int, default=1, help='Threads polling the read endpoints')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between read polls')
+    parser.add_argument('--image-dir', help='Use images from this directory instead of synthetic faces')
+    parser.add_argument('--image-size', type=int, default=480)
+    parser.add_argument('--num-frames', type=int, default=16, help='Distinct synthetic frames to cycle through')
+    parser.add_argument('--db', help='Database file to measure growth of (default: the spawned server\'s)')
+    parser.add_argument('--report', help='Also write the report as JSON to this file')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    frames = load_frames(args)
+
+    process = None
+    workdir = None
+    base_url = args.url.rstrip('/')
+    db_path = args.db
+    if args.spawn:
+        workdir = tempfile.mkdtemp(prefix='affectsense-loadtest-')
+        print(f"Starting server in {workdir}")
+        process, base_url, spawned_db = spawn_server(workdir)
+        db_path = db_path or spawned_db
+
+    stats = Stats()
+    stop_event = threading.Event()
+    session_ids = []
+    db_before = db_size(db_path)
+    threads = [
+        threading.Thread(target=camera_client,
+                         args=(base_url, frames, args, stats, stop_event, session_ids, i), daemon=True)
+        for i in range(args.clients)
+    ]
+    threads += [
+        threading.Thread(target=read_poller, args=(base_url, args, stats, stop_event, session_ids), daemon=True)
+        for _ in range(args.pollers)
+    ]
+
+    print(f"Running {args.clients} clients at {args.fps} fps against {base_url} for {args.duration}s")
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        stop_event.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=30)
+    duration = time.perf_counter() - start
+
+    try:
+        report = build_report(stats, args, duration, session_ids, base_url, db_before, db_size(db_path))
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == '__main__':
+    main()
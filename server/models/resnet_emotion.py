@@ -25,3 +25,18 @@ class EmotionResNet(nn.Module):
 
     def forward(self, x):
         return self.base_model(x)
+
+def load_emotion_model(cfg, device):
+    """Build the model from the config and load the checkpoint weights"""
+    model = EmotionResNet(
+        num_classes=cfg['training']['num_classes'], 
+        pretrained=cfg['training']['pretrained']
+    ).to(device)
+    if cfg['test'].get('random_weights', False):
+        # Only meant for load tests and smoke runs, where predictions do not matter
+        print("\n⚠️ test.random_weights is set, the emotion model is NOT loaded from a checkpoint")
+    else:
+        checkpoint = torch.load(cfg['test']['ckpt'], map_location=device)
+        model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model
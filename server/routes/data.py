@@ -9,6 +9,7 @@ import io
 import traceback
 
 from database import get_db_connection
+from utils.retention import load_session_records
 
 data_bp = Blueprint('data', __name__)
 
@@ -22,17 +23,12 @@ def export_session_data(session_id):
         cursor.execute("SELECT * FROM sessions WHERE id = ?", (session_id,))
         session = cursor.fetchone()
         session_name = session['name'] if session else ''
+        conn.close()
         if not session:
             return jsonify({'error': 'Session not found'}), 404
         
-        cursor.execute("""
-            SELECT timestamp, angry, disgust, fear, happy, sad, surprise, neutral, predicted_class
-            FROM emotion_records 
-            WHERE session_id = ? 
-            ORDER BY timestamp
-        """, (session_id,))
-        records = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        # Archived sessions are read back from their archive file
+        records = load_session_records(session_id) or []
         
         df = pd.DataFrame(records)
         csv_buffer = io.StringIO()
@@ -80,22 +76,9 @@ def get_latest_emotions():
 def get_session_emotions(session_id):
     """Get all emotion records for a specific session"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get emotion records for the session
-        cursor.execute("""
-            SELECT e.timestamp, e.angry, e.disgust, e.fear, e.happy, e.sad, e.surprise, e.neutral, 
-                   e.predicted_class
-            FROM emotion_records e
-            JOIN sessions s ON e.session_id = s.id
-            WHERE s.id = ?
-            ORDER BY e.timestamp
-        """, (session_id,))
-        
-        records = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return jsonify(records)
+        # Served from the live table, or from the archive once the session is archived
+        records = load_session_records(session_id)
+        return jsonify(records or [])
     except Exception as e:
         print(f"Error retrieving session emotions: {e}")
         traceback.print_exc()
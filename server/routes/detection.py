@@ -8,17 +8,21 @@ import numpy as np
 import base64
 import traceback
 import os
+import math
+import time
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 import torch
 
-from utils.image_processing import process_frame
+from utils.image_processing import process_frame, get_empty_result
+from utils.latency_controller import get_controller, latency_cfg
+from utils.serialization import result_response
+from utils.profiling import profiled, stage
 from database import (
-    current_session_id, 
     save_emotions_to_db, 
     save_single_emotion, 
-    emotion_buffer,
     force_save_remaining_emotions,
+    is_session_active,
     BUFFER_SIZE
 )
 
@@ -39,6 +43,7 @@ def record_params(setup_state):
         device = global_device
 
 @detection_bp.route('/api/process_frame', methods=['POST'])
+@profiled('process_frame')
 def api_process_frame():
     """Process a single frame and return emotion predictions"""
     if 'image' not in request.json:
@@ -46,31 +51,76 @@ def api_process_frame():
     
     try:
         isCamera = request.json.get('isCamera', False)
-        session_id = request.json.get('session_id', current_session_id)
+        # The frontend shape is the default; clients opt into compact JSON or MessagePack
+        response_format = request.args.get('format') or request.json.get('response_format', 'default')
+        if request.accept_mimetypes.best == 'application/x-msgpack':
+            response_format = 'msgpack'
+        precision = request.json.get('precision')
+        if precision is not None and (isinstance(precision, bool) or not isinstance(precision, int) or precision < 0):
+            return jsonify({'error': 'precision must be a non-negative integer'}), 400
+        # Session state is request-scoped: guessing another client's session would mix their frames
+        session_id = request.json.get('session_id')
         if not session_id:
-            return jsonify({'error': 'No session ID provided or active'}), 400
+            return jsonify({'error': 'No session ID provided'}), 400
+        # Ended sessions may already be archived, so their frames would never be served
+        if not is_session_active(session_id):
+            return jsonify({'error': 'Session is not active'}), 400
             
-        image_data = request.json['image'].split(',')[1] if ',' in request.json['image'] else request.json['image']
-        image_bytes = base64.b64decode(image_data)
-        
-        # Convert to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Pass use_retinaface=False when isCamera is True for faster processing
+        detection_params = {'use_retinaface': not isCamera}
         
-        if frame is None or frame.size == 0:
-            return jsonify({'error': 'Invalid image data'}), 400
+        # Clients asking for a latency or fps target get settings tuned to their measured timings
+        target_latency_ms = request.json.get('target_latency_ms')
+        target_fps = request.json.get('target_fps')
+        for name, value in (('target_latency_ms', target_latency_ms), ('target_fps', target_fps)):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                      or not math.isfinite(value) or value <= 0):
+                return jsonify({'error': f'{name} must be a positive number'}), 400
+        controller = None
+        if target_latency_ms or target_fps or latency_cfg.get('enabled', False):
+            controller = get_controller(session_id, target_latency_ms, target_fps, use_retinaface=(not isCamera))
+            detection_params = controller.acquire()
+            if detection_params is None:
+                # Answer skipped frames with the last result instead of queueing them
+                skipped = controller.last_result or get_empty_result(
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"), session_id
+                )
+                response = result_response(skipped, response_format, precision)
+                response.headers['X-Frame-Skipped'] = '1'
+                return response
         
-        # Pass use_retinaface=False when isCamera is True for faster processing
-        result = process_frame(frame, model, device, session_id, use_retinaface=(not isCamera))
+        result = None
+        start = time.perf_counter()
+        try:
+            with stage('decode'):
+                image_data = request.json['image'].split(',')[1] if ',' in request.json['image'] else request.json['image']
+                image_bytes = base64.b64decode(image_data)
+                
+                # Convert to numpy array
+                nparr = np.frombuffer(image_bytes, np.uint8)
+                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            
+            if frame is None or frame.size == 0:
+                return jsonify({'error': 'Invalid image data'}), 400
+            
+            result = process_frame(frame, model, device, session_id, **detection_params)
+        finally:
+            if controller:
+                controller.record((time.perf_counter() - start) * 1000, result)
         
         if result:
             result['session_id'] = session_id
             
-            saved = save_single_emotion(result)
+            with stage('db_write'):
+                saved = save_single_emotion(result)
             if not saved:
                 current_app.logger.warning(f"Failed to save emotion for session {session_id}")
                 
-            return jsonify(result)
+            with stage('serialize'):
+                response = result_response(result, response_format, precision)
+            if controller:
+                response.headers['X-Quality-Level'] = str(controller.stats()['level'])
+            return response
         else:
             return jsonify({'error': 'Failed to process frame'}), 500
     except Exception as e:
@@ -79,6 +129,7 @@ def api_process_frame():
         return jsonify({'error': str(e)}), 500
 
 @detection_bp.route('/api/process_folder', methods=['POST'])
+@profiled('process_folder')
 def process_folder():
     """Process a folder of images for batch analysis"""
     if 'images' not in request.files:
@@ -88,6 +139,11 @@ def process_folder():
     
     if not session_id:
         return jsonify({'error': 'No session ID specified'}), 400
+    if not is_session_active(session_id):
+        return jsonify({'error': 'Session is not active'}), 400
+    
+    # Buffer is local to this request so concurrent uploads never mix their records
+    emotion_buffer = []
     
     try:
         images = request.files.getlist('images')
@@ -95,14 +151,12 @@ def process_folder():
         last_result = None
         processed_count = 0
         
-        global emotion_buffer
-        emotion_buffer.clear()
-        
         for image_file in images:
             try:
-                img_bytes = image_file.read()
-                nparr = np.frombuffer(img_bytes, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                with stage('decode'):
+                    img_bytes = image_file.read()
+                    nparr = np.frombuffer(img_bytes, np.uint8)
+                    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                 
                 if img is None or img.size == 0:
                     print(f"Warning: Could not decode image {image_file.filename}")
@@ -122,14 +176,16 @@ def process_folder():
                     
                     if len(emotion_buffer) >= BUFFER_SIZE:
                         print(f"Saving batch of {len(emotion_buffer)} emotions")
-                        save_emotions_to_db()
+                        with stage('db_write'):
+                            save_emotions_to_db(emotion_buffer)
             except Exception as e:
                 print(f"Error processing image {image_file.filename}: {e}")
                 continue
         
         if emotion_buffer:
             print(f"Saving remaining {len(emotion_buffer)} emotions")
-            force_save_remaining_emotions()
+            with stage('db_write'):
+                force_save_remaining_emotions(emotion_buffer)
         
         return jsonify({
             'message': f'Processed {processed_count} images',
@@ -140,7 +196,7 @@ def process_folder():
         
     except Exception as e:
         if emotion_buffer:
-            force_save_remaining_emotions()
+            force_save_remaining_emotions(emotion_buffer)
             
         print(f"Error processing folder: {e}")
         traceback.print_exc()
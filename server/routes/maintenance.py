@@ -0,0 +1,42 @@
+# --------------------------------------------------------
+# AffectSense
+# Copyright 2025 Tavaheed Tariq , GAASH LAB
+# --------------------------------------------------------
+
+from flask import Blueprint, request, jsonify, send_from_directory
+import traceback
+
+from utils.retention import run_retention
+from utils.profiling import list_profiles, profile_dir, PROFILE_FILES
+
+maintenance_bp = Blueprint('maintenance', __name__)
+
+@maintenance_bp.route('/api/maintenance/retention', methods=['POST'])
+def trigger_retention():
+    """Archive old sessions and compact the database"""
+    data = request.get_json(silent=True) or {}
+    try:
+        archived = run_retention(data.get('archive_after_days'))
+        return jsonify({'archived_session_ids': archived})
+    except Exception as e:
+        print(f"Error running retention: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@maintenance_bp.route('/api/profiles', methods=['GET'])
+def get_profiles():
+    """List stored request profiles with their stage timings"""
+    try:
+        return jsonify(list_profiles())
+    except Exception as e:
+        print(f"Error listing profiles: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@maintenance_bp.route('/api/profiles/<profile_id>/<kind>', methods=['GET'])
+def download_profile(profile_id, kind):
+    """Download a stored profile: its summary (json), cProfile stats (prof) or torch trace (trace)"""
+    if kind not in PROFILE_FILES:
+        return jsonify({'error': f'Unknown profile file {kind}'}), 400
+    # send_from_directory refuses paths that escape the profile directory
+    return send_from_directory(profile_dir(), profile_id + PROFILE_FILES[kind], as_attachment=True)
@@ -7,64 +7,42 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 import traceback
 
-from database import get_db_connection, current_session_id
+from database import get_db_connection, get_active_session, create_session, close_session, incremental_vacuum
+from utils.retention import delete_archive
+from utils.latency_controller import remove_controller
 
 sessions_bp = Blueprint('sessions', __name__)
 
 @sessions_bp.route('/api/session/start', methods=['POST'])
 def start_session():
     """Start a new emotion tracking session"""
-    global current_session_id
     data = request.json
     session_name = data.get('name', f'Session {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
     
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO sessions (start_time, name) VALUES (?, ?)",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), session_name)
-        )
-        conn.commit()
-        session_id = cursor.lastrowid
-        current_session_id = session_id
-        
+        session_id = create_session(session_name)
         return jsonify({'session_id': session_id})
     except Exception as e:
         print(f"Error starting session: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @sessions_bp.route('/api/session/end', methods=['POST'])
 def end_session():
-    """End the current emotion tracking session"""
-    global current_session_id
-    if current_session_id:
-        conn = None
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE sessions SET end_time = ? WHERE id = ?",
-                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), current_session_id)
-            )
-            conn.commit()
-            session_id = current_session_id
-            current_session_id = None
-            return jsonify({'ended_session_id': session_id})
-        except Exception as e:
-            print(f"Error ending session: {e}")
-            traceback.print_exc()
-            return jsonify({'error': str(e)}), 500
-        finally:
-            if conn:
-                conn.close()
-    return jsonify({'error': 'No active session'}), 400
+    """End the given emotion tracking session"""
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id')
+    if not session_id:
+        return jsonify({'error': 'No session ID provided'}), 400
+    try:
+        if not close_session(session_id):
+            return jsonify({'error': 'No active session'}), 400
+        remove_controller(session_id)
+        return jsonify({'ended_session_id': session_id})
+    except Exception as e:
+        print(f"Error ending session: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
 
 @sessions_bp.route('/api/sessions', methods=['GET'])
 def get_sessions():
@@ -93,7 +71,7 @@ def delete_session(session_id):
         cursor = conn.cursor()
         
         # Check if session exists
-        cursor.execute("SELECT id, start_time, end_time FROM sessions WHERE id = ?", (session_id,))
+        cursor.execute("SELECT id, start_time, end_time, archive_path FROM sessions WHERE id = ?", (session_id,))
         session = cursor.fetchone()
         if not session:
             return jsonify({'error': 'Session not found'}), 404
@@ -114,6 +92,8 @@ def delete_session(session_id):
         # Delete the session
         cursor.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
         conn.commit()
+        delete_archive(session['archive_path'])
+        incremental_vacuum()
         
         return jsonify({'message': 'Session deleted successfully'}), 200
     except Exception as e:
@@ -129,27 +109,12 @@ def delete_session(session_id):
 @sessions_bp.route('/api/session/current', methods=['GET'])
 def get_current_session():
     """Get the currently active session, if any"""
-    global current_session_id
-    if current_session_id:
-        conn = None
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM sessions WHERE id = ?", (current_session_id,))
-            session = cursor.fetchone()
-            
-            if session:
-                return jsonify(dict(session))
-            else:
-                current_session_id = None
-                return jsonify({'error': 'Session not found'}), 404
-        except Exception as e:
-            print(f"Error retrieving current session: {e}")
-            traceback.print_exc()
-            return jsonify({'error': str(e)}), 500
-        finally:
-            if conn:
-                conn.close()
-    else:
-        return jsonify({'active': False}), 200
\ No newline at end of file
+    try:
+        session = get_active_session()
+        if session:
+            return jsonify(dict(session))
+        return jsonify({'active': False}), 200
+    except Exception as e:
+        print(f"Error retrieving current session: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
\ No newline at end of file
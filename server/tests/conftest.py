@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+
+import pytest
+import yaml
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# Modules read the config at import time, so point them at a scratch config first
+_workdir = tempfile.mkdtemp(prefix='affectsense-tests-')
+with open(os.path.join(SERVER_DIR, 'configs', 'config.yaml'), 'r') as file:
+    _cfg = yaml.safe_load(file)
+_cfg['training']['pretrained'] = False
+_cfg['test']['random_weights'] = True
+_cfg['database'] = {'path': os.path.join(_workdir, 'emotions.db')}
+_cfg['retention']['archive_dir'] = os.path.join(_workdir, 'archives')
+_cfg['retention']['interval_minutes'] = 0
+_cfg['profiling']['output_dir'] = os.path.join(_workdir, 'profiles')
+_config_path = os.path.join(_workdir, 'config.yaml')
+with open(_config_path, 'w') as file:
+    yaml.safe_dump(_cfg, file)
+os.environ['AFFECTSENSE_CONFIG'] = _config_path
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh database file for each test"""
+    import database
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'emotions.db'))
+    database.init_db()
+    return database
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+def _emotion(session_id):
+    return {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'Angry': 0.1, 'Disgust': 0.1, 'Fear': 0.1, 'Happy': 0.4,
+        'Sad': 0.1, 'Surprise': 0.1, 'Neutral': 0.1,
+        'predicted_class': 'Happy',
+        'session_id': session_id
+    }
+
+def _freelist_count(db):
+    conn = db.get_db_connection()
+    try:
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_incremental_vacuum_reclaims_all_free_pages(db):
+    session_id = db.create_session('vacuum')
+    assert db.save_emotions_to_db([_emotion(session_id) for _ in range(5000)])
+
+    conn = db.get_db_connection()
+    conn.execute("DELETE FROM emotion_records")
+    conn.commit()
+    conn.close()
+    assert _freelist_count(db) > 1
+
+    assert db.incremental_vacuum()
+    assert _freelist_count(db) == 0
+
+def test_ended_session_rejects_records(db):
+    session_id = db.create_session('ended')
+    assert db.save_single_emotion(_emotion(session_id))
+    assert db.close_session(session_id)
+
+    assert not db.is_session_active(session_id)
+    assert not db.save_single_emotion(_emotion(session_id))
+    assert db.save_emotions_to_db([_emotion(session_id)])
+
+    conn = db.get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM emotion_records WHERE session_id = ?", (session_id,)).fetchone()[0]
+    conn.close()
+    assert count == 1
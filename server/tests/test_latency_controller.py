@@ -0,0 +1,67 @@
+import pytest
+from flask import Flask
+
+from utils.latency_controller import LatencyController, get_controller
+
+def _run(controller, frames, elapsed_ms):
+    for _ in range(frames):
+        if controller.acquire() is not None:
+            controller.record(elapsed_ms, {})
+
+def test_camera_session_never_upgrades_to_retinaface():
+    controller = LatencyController(100.0, start_level=1)
+    _run(controller, 500, 5.0)
+    assert controller.level == 1
+
+def test_slow_frames_degrade_and_fast_frames_recover():
+    controller = LatencyController(100.0, start_level=0)
+    _run(controller, 30, 300.0)
+    assert controller.level > 0
+    _run(controller, 500, 5.0)
+    assert controller.level == 0
+
+def _stream(controller, frames, fps, elapsed_ms):
+    """Send frames at a fixed rate on a simulated clock"""
+    now = 0.0
+    for _ in range(frames):
+        now += 1.0 / fps
+        if controller.acquire() is not None:
+            controller.record(elapsed_ms, {}, now=now)
+
+def test_fast_frames_at_high_rate_skip_on_duty_cycle():
+    # 40 ms frames meet the latency target, but at 20 fps they keep a core 80% busy
+    controller = LatencyController(100.0, start_level=1)
+    _stream(controller, 200, 20, 40.0)
+    assert controller.level == 1
+    assert controller.stats()['frame_skip'] > 0
+    assert controller.duty_cycle() <= controller.max_duty_cycle
+
+def test_skipping_backs_off_when_duty_cycle_drops():
+    controller = LatencyController(100.0, start_level=1)
+    _stream(controller, 200, 20, 40.0)
+    assert controller.stats()['frame_skip'] > 0
+    _stream(controller, 2000, 20, 2.0)
+    assert controller.stats()['frame_skip'] == 0
+
+@pytest.mark.parametrize('field, value', [
+    ('target_fps', 'abc'), ('target_fps', -5), ('target_fps', 0),
+    ('target_latency_ms', '100'), ('target_latency_ms', -100), ('target_latency_ms', True)
+])
+def test_invalid_targets_are_rejected(db, field, value):
+    from routes.detection import detection_bp
+
+    session_id = db.create_session('targets')
+    app = Flask(__name__)
+    # The request is rejected before the model is used
+    app.config['model'] = object()
+    app.config['device'] = None
+    app.register_blueprint(detection_bp)
+    response = app.test_client().post('/api/process_frame', json={
+        'image': '', 'session_id': session_id, field: value
+    })
+    assert response.status_code == 400
+    assert field in response.get_json()['error']
+
+def test_target_fps_sets_target_latency():
+    controller = get_controller('fps-target', target_fps=20)
+    assert controller.target_latency_ms == pytest.approx(50.0)
@@ -0,0 +1,22 @@
+import pytest
+from flask import Flask
+
+from utils import profiling
+
+@pytest.mark.parametrize('header, query, expected', [
+    ('1', None, True),
+    ('true', None, True),
+    ('Yes', None, True),
+    ('0', None, False),
+    ('false', None, False),
+    (None, 'true', True),
+    (None, '0', False),
+    (None, 'false', False),
+    (None, None, False),
+])
+def test_profile_flag_is_parsed_as_boolean(header, query, expected, monkeypatch):
+    monkeypatch.setitem(profiling.profiling_cfg, 'sample_rate', 0.0)
+    headers = {'X-Profile': header} if header is not None else {}
+    query_string = {'profile': query} if query is not None else {}
+    with Flask(__name__).test_request_context('/', headers=headers, query_string=query_string):
+        assert profiling.should_profile() is expected
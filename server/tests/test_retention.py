@@ -0,0 +1,83 @@
+import os
+
+import pytest
+from flask import Flask
+
+from routes.data import data_bp
+from routes.sessions import sessions_bp
+from utils import retention
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.register_blueprint(sessions_bp)
+    app.register_blueprint(data_bp)
+    return app.test_client()
+
+def _ended_session(db, count):
+    session_id = db.create_session('retention')
+    assert db.save_emotions_to_db([
+        {
+            'timestamp': f'2020-01-01 00:00:{i:02d}',
+            'Angry': 0.05, 'Disgust': 0.05, 'Fear': 0.1, 'Happy': 0.123456789,
+            'Sad': 0.2, 'Surprise': 0.15, 'Neutral': 0.326543211,
+            'predicted_class': 'Neutral',
+            'session_id': session_id
+        }
+        for i in range(count)
+    ])
+    conn = db.get_db_connection()
+    conn.execute("UPDATE sessions SET end_time = ? WHERE id = ?", ('2020-01-01 00:01:00', session_id))
+    conn.commit()
+    conn.close()
+    return session_id
+
+def _live_rows(db, session_id):
+    conn = db.get_db_connection()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM emotion_records WHERE session_id = ?", (session_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def _archive_path(db, session_id):
+    conn = db.get_db_connection()
+    try:
+        return conn.execute("SELECT archive_path FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def test_archived_session_is_served_from_its_archive(db, client):
+    session_id = _ended_session(db, 40)
+    emotions = client.get(f'/api/session/{session_id}/emotions').get_json()
+    export = client.get(f'/api/session/{session_id}/export').data
+    assert len(emotions) == 40
+
+    assert retention.run_retention() == [session_id]
+
+    path = _archive_path(db, session_id)
+    assert path and os.path.exists(path)
+    assert _live_rows(db, session_id) == 0
+    assert client.get(f'/api/session/{session_id}/emotions').get_json() == emotions
+    assert client.get(f'/api/session/{session_id}/export').data == export
+
+def test_recent_and_open_sessions_are_not_archived(db):
+    open_id = db.create_session('open')
+    ended_id = _ended_session(db, 5)
+    conn = db.get_db_connection()
+    conn.execute("UPDATE sessions SET end_time = datetime('now', 'localtime') WHERE id = ?", (ended_id,))
+    conn.commit()
+    conn.close()
+
+    assert retention.run_retention(archive_after_days=1) == []
+    assert _archive_path(db, open_id) is None
+    assert _live_rows(db, ended_id) == 5
+
+def test_deleting_archived_session_removes_its_file(db, client):
+    session_id = _ended_session(db, 10)
+    assert retention.run_retention() == [session_id]
+    path = _archive_path(db, session_id)
+    assert os.path.exists(path)
+
+    assert client.delete(f'/api/session/{session_id}').status_code == 200
+    assert not os.path.exists(path)
+    assert client.get(f'/api/session/{session_id}/emotions').get_json() == []
@@ -0,0 +1,51 @@
+import msgpack
+import pytest
+from flask import Flask
+
+from utils.image_processing import class_names
+from utils.serialization import FastJSONProvider, result_response
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+def _result():
+    face = {name: 1 / 7 for name in class_names}
+    face.update({'predicted_class': class_names[0], 'confidence': 1 / 7, 'face_coords': [1, 2, 3, 4]})
+    result = {'timestamp': '2025-01-01 00:00:00', 'faces_found': True, 'faces': [face], 'session_id': 3}
+    result.update({name: face[name] for name in class_names})
+    result.update({'predicted_class': face['predicted_class'], 'confidence': face['confidence']})
+    return result
+
+def test_msgpack_keeps_requested_precision(app):
+    with app.app_context():
+        response = result_response(_result(), 'msgpack', precision=4)
+    decoded = msgpack.unpackb(response.get_data())
+    assert decoded['faces'][0]['probs'][0] == 0.1429
+    assert decoded['faces'][0]['confidence'] == 0.1429
+
+    with app.app_context():
+        response = result_response(_result(), 'msgpack', precision=10)
+    assert msgpack.unpackb(response.get_data())['faces'][0]['probs'][0] == round(1 / 7, 10)
+
+def test_compact_drops_duplicated_fields(app):
+    with app.app_context():
+        compact = app.json.loads(result_response(_result(), 'compact', precision=2).get_data())
+    assert 'predicted_class' not in compact and class_names[0] not in compact
+    assert compact['faces'][0]['probs'] == [0.14] * len(class_names)
+
+@pytest.mark.parametrize('precision', ['4', 2.5, -1, True])
+def test_invalid_precision_is_rejected(precision):
+    from routes.detection import detection_bp
+
+    app = Flask(__name__)
+    # The request is rejected before the model is used
+    app.config['model'] = object()
+    app.config['device'] = None
+    app.register_blueprint(detection_bp)
+    response = app.test_client().post('/api/process_frame', json={
+        'image': '', 'session_id': 1, 'response_format': 'compact', 'precision': precision
+    })
+    assert response.status_code == 400
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pytest
+import torch
+
+from loadtest import synthetic_face
+from models.resnet_emotion import EmotionResNet
+from utils import image_processing
+
+@pytest.fixture(scope='module')
+def model():
+    model = EmotionResNet(num_classes=len(image_processing.class_names), pretrained=False)
+    model.eval()
+    return model
+
+def _frame(seed):
+    return np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+def _haar_boxes(frame):
+    return [tuple(int(v) for v in box) for box in image_processing.detect_faces(frame, use_retinaface=False)]
+
+def test_concurrent_haar_detection():
+    rng = np.random.default_rng(0)
+    frames = [synthetic_face(320, rng) for _ in range(8)]
+    expected = [_haar_boxes(frame) for frame in frames]
+    # Frames without detections would make the comparison below meaningless
+    assert all(expected)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        found = list(executor.map(lambda i: _haar_boxes(frames[i % 8]), range(64)))
+
+    assert found == [expected[i % 8] for i in range(64)]
+
+def test_concurrent_process_frame(model, monkeypatch):
+    # Random frames rarely contain a face, so fix the detections to exercise the forward pass
+    monkeypatch.setattr(image_processing, 'detect_faces', lambda frame, *args, **kwargs: [(40, 30, 120, 120)])
+    frame = _frame(0)
+    expected = image_processing.process_frame(frame, model, torch.device('cpu'), session_id=1)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda i: image_processing.process_frame(frame, model, torch.device('cpu'), session_id=i),
+            range(1, 33)
+        ))
+
+    for session_id, result in enumerate(results, start=1):
+        assert result is not None
+        assert result['session_id'] == session_id
+        assert result['predicted_class'] == expected['predicted_class']
+        assert result['confidence'] == pytest.approx(expected['confidence'], abs=1e-5)
+
+def test_concurrent_writes_land_in_their_sessions(db):
+    session_ids = [db.create_session(f'client-{i}') for i in range(8)]
+    writes_per_session = 50
+
+    def write(session_id):
+        return all(
+            db.save_single_emotion({
+                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'Happy': 1.0,
+                'predicted_class': 'Happy',
+                'session_id': session_id
+            })
+            for _ in range(writes_per_session)
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(executor.map(write, session_ids))
+
+    conn = db.get_db_connection()
+    counts = dict(conn.execute(
+        "SELECT session_id, COUNT(*) FROM emotion_records GROUP BY session_id"
+    ).fetchall())
+    conn.close()
+    assert counts == {session_id: writes_per_session for session_id in session_ids}
@@ -10,9 +10,12 @@ import numpy as np
 from datetime import datetime
 from PIL import Image
 from torchvision import transforms
+import queue
+import threading
 import traceback
-from database import emotion_buffer, current_session_id, save_emotions_to_db, BUFFER_SIZE
+from contextlib import contextmanager
 from config import load_config
+from utils.profiling import stage
 
 try:
     from retinaface import RetinaFace
@@ -33,7 +36,33 @@ transform = transforms.Compose([
 
 class_names = cfg['dataset']['class_names']
 
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+# CascadeClassifier is not safe to use from two threads at once, and the server
+# starts a thread per connection, so cascades are loaded once and lent out from a pool
+_cascade_pool = queue.Queue()
+
+_retinaface_model = None
+_retinaface_lock = threading.Lock()
+
+@contextmanager
+def face_cascade():
+    """Borrow a cascade from the pool, loading a new one only when all are in use"""
+    try:
+        cascade = _cascade_pool.get_nowait()
+    except queue.Empty:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    try:
+        yield cascade
+    finally:
+        _cascade_pool.put(cascade)
+
+def get_retinaface_model():
+    """Build the RetinaFace model once instead of racing to build it in every thread"""
+    global _retinaface_model
+    if _retinaface_model is None:
+        with _retinaface_lock:
+            if _retinaface_model is None:
+                _retinaface_model = RetinaFace.build_model()
+    return _retinaface_model
 
 def get_empty_result(timestamp, session_id=None):
     empty_result = {
@@ -47,8 +76,8 @@ def get_empty_result(timestamp, session_id=None):
     empty_result['predicted_class'] = 'No face detected'
     empty_result['confidence'] = 0.0
     
-    if session_id or current_session_id:
-        empty_result['session_id'] = session_id or current_session_id
+    if session_id:
+        empty_result['session_id'] = session_id
         
     return empty_result
 
@@ -57,17 +86,14 @@ def detect_faces_retinaface(frame, conf_threshold=0.8):
         return []
     
     try:
-        temp_path = "temp_frame.jpg"
-        cv2.imwrite(temp_path, frame)
+        # The frame is passed as an array; a shared temp file would be overwritten by other threads
+        faces = RetinaFace.detect_faces(
+            frame, 
+            threshold=conf_threshold, 
+            model=get_retinaface_model(), 
+            allow_upscaling=True
+        )
         
-        faces = RetinaFace.detect_faces(temp_path, threshold=conf_threshold, allow_upscaling=True)
-        
-        try:
-            import os
-            os.remove(temp_path)
-        except:
-            pass
-            
         if not faces:
             return []
             
@@ -86,87 +112,122 @@ def detect_faces_retinaface(frame, conf_threshold=0.8):
         traceback.print_exc()
         return []
 
-def process_frame(frame, model, device, session_id=None, use_retinaface=True):
+def detect_faces(frame, use_retinaface=True, detection_scale=1.0, scale_factor=1.1, min_size=None):
+    """Return face regions in (x, y, w, h) format, in full-frame coordinates"""
+    # Detection can run on a downscaled copy; faces are still cropped from the full frame
+    detection_frame = frame
+    if detection_scale < 1.0:
+        with stage('downscale'):
+            detection_frame = cv2.resize(frame, None, fx=detection_scale, fy=detection_scale,
+                                         interpolation=cv2.INTER_AREA)
+    
+    # Detect faces using RetinaFace
+    face_regions = []
+    if use_retinaface and RETINAFACE_AVAILABLE:
+        with stage('retinaface'):
+            face_regions = detect_faces_retinaface(detection_frame)
+        
+    # Fall back to Haar cascade if RetinaFace didn't find any faces or is not available
+    if not face_regions:
+        with stage('haar'):
+            gray_frame = cv2.cvtColor(detection_frame, cv2.COLOR_BGR2GRAY)
+            with face_cascade() as cascade:
+                face_regions = cascade.detectMultiScale(
+                    gray_frame, 
+                    scaleFactor=scale_factor, 
+                    minNeighbors=5,
+                    minSize=tuple(min_size) if min_size else (0, 0)
+                )
+    
+    if detection_scale < 1.0:
+        face_regions = [tuple(int(round(c / detection_scale)) for c in face_coords)
+                        for face_coords in face_regions]
+    
+    return face_regions
+
+def extract_faces(frame, face_regions):
+    """Crop and transform each face, returning (face_coords, tensor) pairs"""
+    faces = []
+    for face_coords in face_regions:
+        # Extract face image
+        x, y, w, h = face_coords
+        # Ensure coordinates are within frame bounds
+        x = max(0, x)
+        y = max(0, y)
+        w = min(w, frame.shape[1] - x)
+        h = min(h, frame.shape[0] - y)
+        
+        face_img = frame[y:y+h, x:x+w]
+        
+        # Skip if face region is empty
+        if face_img.size == 0:
+            continue
+            
+        image = Image.fromarray(cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB))
+        faces.append(([int(c) for c in face_coords], transform(image)))
+    return faces
+
+def classify_faces(faces, model, device):
+    """Run the model on a batch of (face_coords, tensor) pairs in a single forward pass"""
+    if not faces:
+        return []
+    
+    image_tensor = torch.stack([torch.as_tensor(tensor) for _, tensor in faces]).to(device)
+    with torch.inference_mode():
+        output = model(image_tensor)
+        probs = F.softmax(output, dim=1).cpu()
+        confidence, pred = torch.max(probs, dim=1)
+    
+    faces_data = []
+    for i, (face_coords, _) in enumerate(faces):
+        probabilities = {class_names[j]: float(probs[i][j].item()) for j in range(len(class_names))}
+        faces_data.append({
+            **probabilities,
+            'predicted_class': class_names[pred[i].item()],
+            'confidence': float(confidence[i].item()),
+            'face_coords': face_coords  # Add face coordinates to result
+        })
+    return faces_data
+
+def build_result(timestamp, faces_data, session_id=None):
+    """Assemble the response for a frame in which faces were detected"""
+    result = {
+        'timestamp': timestamp,
+        'faces_found': True,
+        'faces': faces_data
+    }
+    
+    if faces_data:
+        first_face = faces_data[0]
+        for emotion in class_names:
+            result[emotion] = first_face.get(emotion, 0)
+        result['predicted_class'] = first_face['predicted_class']
+        result['confidence'] = first_face['confidence']
+    
+    if session_id:
+        result['session_id'] = session_id
+    
+    return result
+
+def process_frame(frame, model, device, session_id=None, use_retinaface=True,
+                  detection_scale=1.0, scale_factor=1.1, min_size=None):
     if frame is None or frame.size == 0:
         print("Warning: Empty frame received")
         return None
         
     try:
-        faces_found = False
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Detect faces using RetinaFace
-        face_regions = []
-        if use_retinaface and RETINAFACE_AVAILABLE:
-            face_regions = detect_faces_retinaface(frame)
-            
-        # Fall back to Haar cascade if RetinaFace didn't find any faces or is not available
-        if not face_regions:
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            face_regions = face_cascade.detectMultiScale(
-                gray_frame, 
-                scaleFactor=1.1, 
-                minNeighbors=5
-            )
+        face_regions = detect_faces(frame, use_retinaface, detection_scale, scale_factor, min_size)
         
         if len(face_regions) == 0:
             return get_empty_result(timestamp, session_id)
         
-        faces_found = True
-        faces_data = []
-        
-        for face_coords in face_regions:
-            # Extract face image
-            x, y, w, h = face_coords
-            # Ensure coordinates are within frame bounds
-            x = max(0, x)
-            y = max(0, y)
-            w = min(w, frame.shape[1] - x)
-            h = min(h, frame.shape[0] - y)
-            
-            face_img = frame[y:y+h, x:x+w]
-            
-            # Skip if face region is empty
-            if face_img.size == 0:
-                continue
-                
-            image = Image.fromarray(cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB))
-            
-            image_tensor = transform(image).unsqueeze(0).to(device)
-            with torch.no_grad():
-                output = model(image_tensor)
-                probs = F.softmax(output, dim=1)
-                confidence, pred = torch.max(probs, dim=1)
-            
-            pred_class = class_names[pred.item()]
-            probabilities = {class_names[i]: float(probs[0][i].item()) for i in range(len(class_names))}
-            
-            face_data = {
-                **probabilities,
-                'predicted_class': pred_class,
-                'confidence': float(confidence.item()),
-                'face_coords': [int(c) for c in face_coords]  # Add face coordinates to result
-            }
-            faces_data.append(face_data)
-        
-        result = {
-            'timestamp': timestamp,
-            'faces_found': faces_found,
-            'faces': faces_data
-        }
-        
-        if faces_data:
-            first_face = faces_data[0]
-            for emotion in class_names:
-                result[emotion] = first_face.get(emotion, 0)
-            result['predicted_class'] = first_face['predicted_class']
-            result['confidence'] = first_face['confidence']
-        
-        use_session_id = session_id or current_session_id
-        if use_session_id:
-            result['session_id'] = use_session_id
-        
-        return result
+        with stage('preprocess'):
+            faces = extract_faces(frame, face_regions)
+        with stage('forward'):
+            faces_data = classify_faces(faces, model, device)
+        return build_result(timestamp, faces_data, session_id)
     except Exception as e:
         print(f"Error processing frame: {e}")
         traceback.print_exc()
@@ -0,0 +1,181 @@
+# --------------------------------------------------------
+# AffectSense
+# Copyright 2025 Tavaheed Tariq , GAASH LAB
+# --------------------------------------------------------
+
+import threading
+import time
+from collections import OrderedDict
+from config import load_config
+
+cfg = load_config()
+latency_cfg = cfg.get('latency', {})
+
+# Detection settings ordered from best quality to cheapest; the controller moves along this ladder
+QUALITY_LEVELS = [
+    {'use_retinaface': True, 'detection_scale': 1.0, 'scale_factor': 1.1, 'min_size': None},
+    {'use_retinaface': False, 'detection_scale': 1.0, 'scale_factor': 1.1, 'min_size': (48, 48)},
+    {'use_retinaface': False, 'detection_scale': 0.75, 'scale_factor': 1.2, 'min_size': (36, 36)},
+    {'use_retinaface': False, 'detection_scale': 0.5, 'scale_factor': 1.3, 'min_size': (24, 24)},
+]
+
+# Frames skipped between two processed frames
+FRAME_SKIPS = [0, 1, 3]
+
+class LatencyController:
+    """Pick detection settings and a frame-skip ratio for a session from measured processing times.
+
+    The detection level follows the EWMA of per-frame processing time against
+    the target latency, and never goes above min_level, so a session that
+    started on Haar is not moved back to RetinaFace.
+
+    Skipping frames does not make a processed frame faster, so the skip ratio
+    follows the session's duty cycle instead: per-frame processing time divided
+    by the interval between processed frames, i.e. the share of a core the
+    session keeps busy. Skipping more frames stretches that interval and lowers
+    the duty cycle, which is what lets the controller back off again.
+    """
+
+    def __init__(self, target_latency_ms, start_level=0):
+        self.target_latency_ms = target_latency_ms
+        self.min_level = start_level
+        self.level = start_level
+        self.skip_index = 0
+        self.ewma_ms = None
+        self.ewma_interval_ms = None
+        self.last_processed_at = None
+        self.alpha = latency_cfg.get('ewma_alpha', 0.3)
+        self.upgrade_margin = latency_cfg.get('upgrade_margin', 0.6)
+        self.upgrade_patience = latency_cfg.get('upgrade_patience', 20)
+        self.min_samples = latency_cfg.get('min_samples', 3)
+        self.max_duty_cycle = latency_cfg.get('max_duty_cycle', 0.5)
+        self.samples_at_level = 0
+        self.samples_at_skip = 0
+        self.fast_streak = 0
+        self.idle_streak = 0
+        self.frame_count = 0
+        self.busy = False
+        self.last_result = None
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Return detection settings for the next frame, or None if it should be skipped.
+
+        A frame is skipped when the current skip ratio skips it, or when the previous
+        frame of this session is still being processed so requests do not pile up.
+        """
+        with self.lock:
+            self.frame_count += 1
+            if self.busy:
+                return None
+            frame_skip = FRAME_SKIPS[self.skip_index]
+            if frame_skip and self.frame_count % (frame_skip + 1) != 0:
+                return None
+            self.busy = True
+            return dict(QUALITY_LEVELS[self.level])
+
+    def record(self, elapsed_ms, result, now=None):
+        """Feed back the processing time of a frame handed out by acquire()"""
+        if now is None:
+            now = time.perf_counter()
+        with self.lock:
+            self.busy = False
+            if result is None:
+                return
+            self.last_result = result
+            self.ewma_ms = self._ewma(self.ewma_ms, elapsed_ms)
+            if self.last_processed_at is not None:
+                self.ewma_interval_ms = self._ewma(self.ewma_interval_ms, (now - self.last_processed_at) * 1000)
+            self.last_processed_at = now
+            self.samples_at_level += 1
+            self.samples_at_skip += 1
+            self._adjust_level()
+            self._adjust_skip()
+
+    def duty_cycle(self):
+        if self.ewma_ms is None or not self.ewma_interval_ms:
+            return None
+        return self.ewma_ms / self.ewma_interval_ms
+
+    def _ewma(self, current, sample):
+        if current is None:
+            return sample
+        return self.alpha * sample + (1 - self.alpha) * current
+
+    def _adjust_level(self):
+        if self.samples_at_level < self.min_samples:
+            return
+        if self.ewma_ms > self.target_latency_ms and self.level < len(QUALITY_LEVELS) - 1:
+            self._set_level(self.level + 1)
+        elif self.ewma_ms < self.target_latency_ms * self.upgrade_margin and self.level > self.min_level:
+            self.fast_streak += 1
+            if self.fast_streak >= self.upgrade_patience:
+                self._set_level(self.level - 1)
+        else:
+            self.fast_streak = 0
+
+    def _adjust_skip(self):
+        duty_cycle = self.duty_cycle()
+        if duty_cycle is None or self.samples_at_skip < self.min_samples:
+            return
+        if duty_cycle > self.max_duty_cycle and self.skip_index < len(FRAME_SKIPS) - 1:
+            self._set_skip(self.skip_index + 1)
+        elif duty_cycle < self.max_duty_cycle * self.upgrade_margin and self.skip_index > 0:
+            self.idle_streak += 1
+            if self.idle_streak >= self.upgrade_patience:
+                self._set_skip(self.skip_index - 1)
+        else:
+            self.idle_streak = 0
+
+    def _set_level(self, level):
+        self.level = level
+        self.samples_at_level = 0
+        self.fast_streak = 0
+        # Timings from the previous level say little about the new one
+        self.ewma_ms = None
+
+    def _set_skip(self, skip_index):
+        self.skip_index = skip_index
+        self.samples_at_skip = 0
+        self.idle_streak = 0
+        # The processed-frame interval changes with the skip ratio
+        self.ewma_interval_ms = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'level': self.level,
+                'frame_skip': FRAME_SKIPS[self.skip_index],
+                'ewma_ms': self.ewma_ms,
+                'duty_cycle': self.duty_cycle(),
+                'target_latency_ms': self.target_latency_ms
+            }
+
+_controllers = OrderedDict()
+_controllers_lock = threading.Lock()
+
+def get_controller(session_id, target_latency_ms=None, target_fps=None, use_retinaface=True):
+    """Get or create the latency controller of a session"""
+    if target_fps:
+        target_latency_ms = 1000.0 / float(target_fps)
+    session_id = str(session_id)
+    with _controllers_lock:
+        controller = _controllers.get(session_id)
+        if controller is None:
+            controller = LatencyController(
+                float(target_latency_ms or latency_cfg.get('target_latency_ms', 200)),
+                start_level=0 if use_retinaface else 1
+            )
+            _controllers[session_id] = controller
+            # Forget the least recently used sessions
+            while len(_controllers) > latency_cfg.get('max_sessions', 256):
+                _controllers.popitem(last=False)
+        else:
+            _controllers.move_to_end(session_id)
+            if target_latency_ms:
+                controller.target_latency_ms = float(target_latency_ms)
+        return controller
+
+def remove_controller(session_id):
+    with _controllers_lock:
+        _controllers.pop(str(session_id), None)
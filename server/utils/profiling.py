@@ -0,0 +1,181 @@
+# --------------------------------------------------------
+# AffectSense
+# Copyright 2025 Tavaheed Tariq , GAASH LAB
+# --------------------------------------------------------
+
+import contextvars
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from flask import request, make_response
+import torch
+from config import load_config
+
+cfg = load_config()
+profiling_cfg = cfg.get('profiling', {})
+
+PROFILE_FILES = {
+    'json': '.json',
+    'prof': '.prof',
+    'trace': '.trace.json'
+}
+
+# Set only while a profiled request runs; a context variable keeps concurrent requests apart
+_active_profile = contextvars.ContextVar('active_profile', default=None)
+
+# cProfile and torch.profiler hook the interpreter and the torch runtime, so one request at a time
+_profiler_lock = threading.Lock()
+
+class RequestProfile:
+    """Per-stage timings collected during one request"""
+
+    def __init__(self, name):
+        self.id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.stages = {}
+        self.total_ms = 0.0
+
+    def add(self, stage_name, elapsed_ms):
+        entry = self.stages.setdefault(stage_name, {'ms': 0.0, 'count': 0})
+        entry['ms'] += elapsed_ms
+        entry['count'] += 1
+
+@contextmanager
+def stage(name):
+    """Time a block as a stage of the current profile; does nothing when not profiling"""
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, (time.perf_counter() - start) * 1000)
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+def _flag(value):
+    return value is not None and value.strip().lower() in TRUE_VALUES
+
+def should_profile():
+    if not profiling_cfg.get('enabled', True):
+        return False
+    if _flag(request.headers.get(profiling_cfg.get('header', 'X-Profile'))):
+        return True
+    if _flag(request.args.get(profiling_cfg.get('query_param', 'profile'))):
+        return True
+    return random.random() < profiling_cfg.get('sample_rate', 0.0)
+
+def profile_dir():
+    path = profiling_cfg.get('output_dir', 'profiles')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _prune_profiles(directory):
+    """Keep only the newest max_profiles profiles on disk"""
+    summaries = sorted(
+        (name for name in os.listdir(directory) if name.endswith('.json') and not name.endswith('.trace.json')),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name))
+    )
+    excess = len(summaries) - profiling_cfg.get('max_profiles', 50)
+    for name in summaries[:max(excess, 0)]:
+        profile_id = name[:-len('.json')]
+        for extension in PROFILE_FILES.values():
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+def _write_profile(profile, profiler, torch_profiler):
+    directory = profile_dir()
+    summary = {
+        'id': profile.id,
+        'name': profile.name,
+        'path': request.path,
+        'started_at': profile.started_at,
+        'total_ms': profile.total_ms,
+        'stages': profile.stages,
+        'files': ['json']
+    }
+    if profiler is not None:
+        profiler.dump_stats(os.path.join(directory, profile.id + PROFILE_FILES['prof']))
+        summary['files'].append('prof')
+    if torch_profiler is not None:
+        torch_profiler.export_chrome_trace(os.path.join(directory, profile.id + PROFILE_FILES['trace']))
+        summary['files'].append('trace')
+    with open(os.path.join(directory, profile.id + PROFILE_FILES['json']), 'w') as file:
+        json.dump(summary, file, indent=2)
+    _prune_profiles(directory)
+
+def profiled(name):
+    """Profile a view when the request asks for it or is sampled.
+
+    Stage timings are always collected for a profiled request; the cProfile
+    dump and torch trace are skipped if another request is being profiled.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not should_profile():
+                return view(*args, **kwargs)
+
+            profile = RequestProfile(name)
+            token = _active_profile.set(profile)
+            profiler = None
+            torch_profiler = None
+            locked = _profiler_lock.acquire(blocking=False)
+            if locked:
+                profiler = cProfile.Profile()
+                if profiling_cfg.get('torch_profiler', False):
+                    activities = [torch.profiler.ProfilerActivity.CPU]
+                    if torch.cuda.is_available():
+                        activities.append(torch.profiler.ProfilerActivity.CUDA)
+                    torch_profiler = torch.profiler.profile(activities=activities)
+                    torch_profiler.__enter__()
+                profiler.enable()
+            start = time.perf_counter()
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                profile.total_ms = (time.perf_counter() - start) * 1000
+                if profiler is not None:
+                    profiler.disable()
+                if torch_profiler is not None:
+                    torch_profiler.__exit__(None, None, None)
+                _active_profile.reset(token)
+                try:
+                    _write_profile(profile, profiler, torch_profiler)
+                except Exception as e:
+                    print(f"Error writing profile {profile.id}: {e}")
+                    traceback.print_exc()
+                finally:
+                    if locked:
+                        _profiler_lock.release()
+            response.headers['X-Profile-Id'] = profile.id
+            return response
+        return wrapper
+    return decorator
+
+def list_profiles():
+    """Return the summaries of stored profiles, newest first"""
+    directory = profile_dir()
+    summaries = []
+    for name in os.listdir(directory):
+        if name.endswith('.json') and not name.endswith('.trace.json'):
+            try:
+                with open(os.path.join(directory, name), 'r') as file:
+                    summaries.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+    summaries.sort(key=lambda summary: summary['id'], reverse=True)
+    return summaries
@@ -0,0 +1,186 @@
+# --------------------------------------------------------
+# AffectSense
+# Copyright 2025 Tavaheed Tariq , GAASH LAB
+# --------------------------------------------------------
+
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+import pandas as pd
+
+from database import get_db_connection, incremental_vacuum
+from config import load_config
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+    print("\n⚠️ pyarrow is not installed, session archives will be written as gzipped CSV. Install it with:")
+    print("pip install pyarrow")
+
+cfg = load_config()
+retention_cfg = cfg.get('retention', {})
+
+RECORD_COLUMNS = [
+    'timestamp', 'angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral', 'predicted_class'
+]
+# Archives also keep the source filename of records written by batch and offline analysis
+ARCHIVE_COLUMNS = RECORD_COLUMNS + ['filename']
+
+_retention_lock = threading.Lock()
+
+def _archive_file(session_id):
+    archive_dir = retention_cfg.get('archive_dir', 'archives')
+    os.makedirs(archive_dir, exist_ok=True)
+    extension = 'parquet' if PARQUET_AVAILABLE else 'csv.gz'
+    return os.path.join(archive_dir, f'session_{session_id}.{extension}')
+
+def write_archive(records, path):
+    """Write emotion records to a compressed archive file"""
+    df = pd.DataFrame(records, columns=ARCHIVE_COLUMNS)
+    tmp_path = f'{path}.tmp'
+    if path.endswith('.parquet'):
+        df.to_parquet(tmp_path, index=False, compression='zstd')
+    else:
+        df.to_csv(tmp_path, index=False, compression='gzip')
+    # Only expose complete files under the final name
+    os.replace(tmp_path, path)
+
+def read_archive(path):
+    """Read emotion records back from an archive file"""
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, compression='gzip')
+    df = df.astype(object).where(pd.notnull(df), None)
+    return df[RECORD_COLUMNS].to_dict(orient='records')
+
+def load_session_records(session_id):
+    """Get emotion records for a session from the live table or its archive.
+
+    Returns None if the session does not exist.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, archive_path FROM sessions WHERE id = ?", (session_id,))
+        session = cursor.fetchone()
+        if not session:
+            return None
+
+        if session['archive_path']:
+            return read_archive(session['archive_path'])
+
+        cursor.execute(f"""
+            SELECT {', '.join(RECORD_COLUMNS)}
+            FROM emotion_records
+            WHERE session_id = ?
+            ORDER BY timestamp
+        """, (session_id,))
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        if conn:
+            conn.close()
+
+def archive_session(session_id):
+    """Move the records of an ended session out of the live table"""
+    conn = None
+    path = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, end_time, archive_path FROM sessions WHERE id = ?", (session_id,))
+        session = cursor.fetchone()
+        if not session or not session['end_time'] or session['archive_path']:
+            return False
+
+        cursor.execute(f"""
+            SELECT id, {', '.join(ARCHIVE_COLUMNS)}
+            FROM emotion_records
+            WHERE session_id = ?
+            ORDER BY timestamp
+        """, (session_id,))
+        rows = cursor.fetchall()
+        records = [{column: row[column] for column in ARCHIVE_COLUMNS} for row in rows]
+
+        path = _archive_file(session_id)
+        write_archive(records, path)
+
+        # Only delete the rows that went into the archive, so nothing is lost
+        # even if a row was inserted while the file was being written
+        last_id = max((row['id'] for row in rows), default=0)
+        cursor.execute("DELETE FROM emotion_records WHERE session_id = ? AND id <= ?", (session_id, last_id))
+        cursor.execute("UPDATE sessions SET archive_path = ? WHERE id = ?", (path, session_id))
+        conn.commit()
+        print(f"Archived {len(records)} emotions of session {session_id} to {path}")
+        return True
+    except Exception as e:
+        print(f"Error archiving session {session_id}: {e}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        if path and os.path.exists(path):
+            os.remove(path)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def delete_archive(path):
+    """Remove an archive file, ignoring files that are already gone"""
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def run_retention(archive_after_days=None):
+    """Archive ended sessions older than the retention window and compact the database"""
+    if archive_after_days is None:
+        archive_after_days = retention_cfg.get('archive_after_days', 30)
+    cutoff = (datetime.now() - timedelta(days=archive_after_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    # A single pass at a time, whether triggered by the worker or the API
+    with _retention_lock:
+        conn = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id FROM sessions
+                WHERE end_time IS NOT NULL AND end_time < ? AND archive_path IS NULL
+                ORDER BY end_time
+            """, (cutoff,))
+            session_ids = [row['id'] for row in cursor.fetchall()]
+        finally:
+            if conn:
+                conn.close()
+
+        archived = [session_id for session_id in session_ids if archive_session(session_id)]
+        incremental_vacuum(retention_cfg.get('vacuum_pages'))
+        return archived
+
+def start_retention_worker():
+    """Run retention periodically in a background thread"""
+    interval_minutes = retention_cfg.get('interval_minutes', 0)
+    if not interval_minutes:
+        return None
+
+    stop_event = threading.Event()
+
+    def worker():
+        while not stop_event.is_set():
+            try:
+                run_retention()
+            except Exception as e:
+                print(f"Error running retention: {e}")
+                traceback.print_exc()
+            stop_event.wait(interval_minutes * 60)
+
+    thread = threading.Thread(target=worker, name='retention', daemon=True)
+    thread.start()
+    return stop_event
@@ -0,0 +1,85 @@
+# --------------------------------------------------------
+# AffectSense
+# Copyright 2025 Tavaheed Tariq , GAASH LAB
+# --------------------------------------------------------
+
+from flask import Response, jsonify, current_app
+from flask.json.provider import DefaultJSONProvider
+from config import load_config
+from utils.image_processing import class_names
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("\n⚠️ orjson is not installed, falling back to the standard JSON encoder. Install it with:")
+    print("pip install orjson")
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+cfg = load_config()
+serialization_cfg = cfg.get('serialization', {})
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson, keeping Flask's output for anything orjson rejects"""
+
+    def dumps(self, obj, **kwargs):
+        if ORJSON_AVAILABLE:
+            # Dates and dataclasses go through Flask's default() so their format does not change
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if kwargs.get('indent'):
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, option=option).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if ORJSON_AVAILABLE and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+def compact_result(result, precision=None):
+    """Drop the top-level copy of the first face and round probabilities.
+
+    Each face carries its probabilities as a list in the order of
+    dataset.class_names instead of one key per emotion.
+    """
+    precision = int(precision if precision is not None else serialization_cfg.get('precision', 4))
+    compact = {
+        key: value for key, value in result.items()
+        if key not in class_names and key not in ('predicted_class', 'confidence', 'faces')
+    }
+    compact['faces'] = [
+        {
+            'probs': [round(face[emotion], precision) for emotion in class_names],
+            'predicted_class': face['predicted_class'],
+            'confidence': round(face['confidence'], precision),
+            'face_coords': face['face_coords']
+        }
+        for face in result.get('faces', [])
+    ]
+    return compact
+
+def result_response(result, response_format='default', precision=None):
+    """Serialize a frame result in the requested format.
+
+    'default' keeps the shape the frontend expects; 'compact' and 'msgpack'
+    send the compact_result() shape as JSON or MessagePack.
+    """
+    if response_format not in ('compact', 'msgpack'):
+        return jsonify(result)
+
+    compact = compact_result(result, precision)
+    if response_format == 'msgpack' and MSGPACK_AVAILABLE:
+        # Doubles, so values decode exactly as rounded and any precision is kept
+        return Response(msgpack.packb(compact), mimetype='application/x-msgpack')
+    return Response(current_app.json.dumps(compact, separators=(',', ':')), mimetype='application/json')